@@ -1,14 +1,16 @@
 import gradio as gr
+import asyncio
 import re
 import time
 import tempfile
 import os
-import requests
-from bs4 import BeautifulSoup
-from utils.research_tools import query_groq, GroqClient
+from types import MappingProxyType
+from utils.html_text import fetch_url_text
+from utils.research_tools import query_groq, _get_client
 from utils.logger import (
     log_interaction,
     get_history,
+    get_recent_history,
     clear_history,
     export_history_json,
     export_history_markdown,
@@ -18,49 +20,43 @@ from utils.logger import (
 
 DEFAULT_TEMPERATURE = 0.7
 DEFAULT_MAX_TOKENS = 700
+# minimum seconds between streamed UI updates, so Gradio isn't repainting per token
+STREAM_UPDATE_INTERVAL = 0.05
 
-_client = None
+def _estimate_tokens(text: str) -> int:
+    # very rough heuristic: 1 token ~= 4 chars
+    return max(1, round(len(text) / 4))
 
 
-def _get_client():
-    global _client
-    if _client is None:
-        _client = GroqClient()
-    return _client
+def _format_stats(tokens: int, start: float) -> str:
+    return f"~ tokens (prompt+completion): {tokens} | time: {time.time() - start:.1f}s"
 
 
-def _estimate_tokens(text: str) -> int:
-    # very rough heuristic: 1 token ~= 4 chars
-    return max(1, round(len(text) / 4))
+_PRESETS = MappingProxyType({
+    "Standard": "",
+    "Concise": "Answer concisely with bullet points when helpful.",
+    "Teacher": "Explain like I'm new to the topic, with analogies and step-by-step reasoning.",
+    "Developer": "Use code examples where relevant and be explicit about trade-offs.",
+    "Researcher": "Provide structured analysis with assumptions, evidence, and limitations.",
+})
 
 
 def _apply_preset(name: str) -> str:
-    presets = {
-        "Standard": "",
-        "Concise": "Answer concisely with bullet points when helpful.",
-        "Teacher": "Explain like I'm new to the topic, with analogies and step-by-step reasoning.",
-        "Developer": "Use code examples where relevant and be explicit about trade-offs.",
-        "Researcher": "Provide structured analysis with assumptions, evidence, and limitations.",
-    }
-    return presets.get(name, "")
+    return _PRESETS.get(name, "")
 
 
-def _with_memory(user_query: str, use_memory: bool) -> str:
+def _memory_messages(use_memory: bool) -> list:
+    """Return the last 3 turns as chat messages to send ahead of the new query."""
     if not use_memory:
-        return user_query
-    hist = get_history()[-3:]  # last 3 turns
-    if not hist:
-        return user_query
-    lines = ["Context from earlier in this conversation:"]
-    for h in hist:
+        return []
+    messages = []
+    for h in get_recent_history(3):
         q = h.get("question", "").strip()
         a = h.get("answer", "").strip()
         if q and a:
-            lines.append(f"Q: {q}")
-            lines.append(f"A: {a}")
-    lines.append("")
-    lines.append(f"Current user request: {user_query}")
-    return "\n".join(lines)
+            messages.append({"role": "user", "content": q})
+            messages.append({"role": "assistant", "content": a})
+    return messages
 
 
 def _export_markdown(text: str, prefix: str = "export") -> str:
@@ -71,82 +67,98 @@ def _export_markdown(text: str, prefix: str = "export") -> str:
     return path
 
 
-def ai_research(query, system_prompt, stream, use_memory):
+async def ai_research(query, system_prompt, stream, use_memory):
     if not query.strip():
-        return "Please enter a valid question or topic.", ""
+        yield "Please enter a valid question or topic.", ""
+        return
     start = time.time()
+    # measured once; completion tokens are counted per delta while streaming
+    prompt_tokens = _estimate_tokens(query + (system_prompt or ''))
     if stream:
-        acc = ""
-        for partial in _get_client().chat_stream(
-            _with_memory(query, use_memory),
+        parts = []
+        completion_tokens = 0
+        last_update = 0.0
+        async for delta in _get_client().achat_stream(
+            query,
             model="llama-3.1-8b-instant",
             temperature=DEFAULT_TEMPERATURE,
             max_tokens=DEFAULT_MAX_TOKENS,
             system=system_prompt or None,
+            history=_memory_messages(use_memory),
         ):
-            acc = partial
-            elapsed = time.time() - start
-            stats = f"~ tokens (prompt+completion): {_estimate_tokens(query + (system_prompt or '')) + _estimate_tokens(acc)} | time: {elapsed:.1f}s"
-            yield acc, stats
+            parts.append(delta)
+            completion_tokens += _estimate_tokens(delta)
+            now = time.monotonic()
+            if now - last_update < STREAM_UPDATE_INTERVAL:
+                continue
+            last_update = now
+            # join only when the UI is actually updated
+            yield "".join(parts), _format_stats(prompt_tokens + completion_tokens, start)
+        # flush whatever arrived since the last throttled update
+        acc = "".join(parts)
+        yield acc, _format_stats(prompt_tokens + completion_tokens, start)
         log_interaction(query, acc)
     else:
-        response = query_groq(
-            _with_memory(query, use_memory),
+        response = await asyncio.to_thread(
+            query_groq,
+            query,
             model="llama-3.1-8b-instant",
             temperature=DEFAULT_TEMPERATURE,
             max_tokens=DEFAULT_MAX_TOKENS,
             system=system_prompt or None,
+            history=_memory_messages(use_memory),
         )
         log_interaction(query, response)
-        elapsed = time.time() - start
-        stats = f"~ tokens (prompt+completion): {_estimate_tokens(query + (system_prompt or '')) + _estimate_tokens(response)} | time: {elapsed:.1f}s"
-        return response, stats
+        stats = _format_stats(prompt_tokens + _estimate_tokens(response), start)
+        yield response, stats
 
-def _is_url(text: str) -> bool:
-    return bool(re.match(r"^https?://", text.strip(), re.IGNORECASE))
+_URL_RE = re.compile(r"^\s*https?://", re.IGNORECASE)
 
 
-def _fetch_url_text(url: str, max_chars: int = 6000) -> str:
-    try:
-        r = requests.get(url, timeout=20)
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html.parser")
-        # remove scripts/styles
-        for tag in soup(["script", "style", "noscript"]):
-            tag.extract()
-        text = soup.get_text(separator="\n")
-        text = "\n".join(line.strip() for line in text.splitlines() if line.strip())
-        return text[:max_chars]
-    except Exception:
-        return f"[Could not fetch URL content, summarizing the URL contextually instead]\nURL: {url}"
+def _is_url(text: str) -> bool:
+    return _URL_RE.match(text) is not None
 
 
-def summarize_text_or_url(content, system_prompt, stream):
+async def summarize_text_or_url(content, system_prompt, stream):
     if not content.strip():
-        return "Please provide a URL or text to summarize.", ""
-    source_text = _fetch_url_text(content) if _is_url(content) else content
+        yield "Please provide a URL or text to summarize.", ""
+        return
+    # fetch off the event loop so other sessions keep streaming meanwhile
+    source_text = await asyncio.to_thread(fetch_url_text, content) if _is_url(content) else content
     prompt = (
         "You are a world-class summarizer. Produce a concise, faithful summary with: "
         "- title\n- key points\n- important quotes\n- a short TL;DR.\n\n"
         f"Content to summarize (may be HTML-extracted):\n\n{source_text}"
     )
     start = time.time()
+    # measured once; completion tokens are counted per delta while streaming
+    prompt_tokens = _estimate_tokens(prompt + (system_prompt or ''))
     if stream:
-        acc = ""
-        for partial in _get_client().chat_stream(
+        parts = []
+        completion_tokens = 0
+        last_update = 0.0
+        async for delta in _get_client().achat_stream(
             prompt,
             model="llama-3.1-8b-instant",
             temperature=DEFAULT_TEMPERATURE,
             max_tokens=DEFAULT_MAX_TOKENS,
             system=system_prompt or "Summarize clearly in Markdown.",
         ):
-            acc = partial
-            elapsed = time.time() - start
-            stats = f"~ tokens (prompt+completion): {_estimate_tokens(prompt + (system_prompt or '')) + _estimate_tokens(acc)} | time: {elapsed:.1f}s"
-            yield acc, stats
+            parts.append(delta)
+            completion_tokens += _estimate_tokens(delta)
+            now = time.monotonic()
+            if now - last_update < STREAM_UPDATE_INTERVAL:
+                continue
+            last_update = now
+            # join only when the UI is actually updated
+            yield "".join(parts), _format_stats(prompt_tokens + completion_tokens, start)
+        # flush whatever arrived since the last throttled update
+        acc = "".join(parts)
+        yield acc, _format_stats(prompt_tokens + completion_tokens, start)
         log_interaction(content[:100] + "...", acc)
     else:
-        response = query_groq(
+        response = await asyncio.to_thread(
+            query_groq,
             prompt,
             model="llama-3.1-8b-instant",
             temperature=DEFAULT_TEMPERATURE,
@@ -154,18 +166,17 @@ def summarize_text_or_url(content, system_prompt, stream):
             system=system_prompt or "Summarize clearly in Markdown.",
         )
         log_interaction(content[:100] + "...", response)
-        elapsed = time.time() - start
-        stats = f"~ tokens (prompt+completion): {_estimate_tokens(prompt + (system_prompt or '')) + _estimate_tokens(response)} | time: {elapsed:.1f}s"
-        return response, stats
+        stats = _format_stats(prompt_tokens + _estimate_tokens(response), start)
+        yield response, stats
 
 def view_history():
     history = get_history()
     if not history:
         return "No history available yet."
-    formatted = ""
-    for h in reversed(history):
-        formatted += f"### {h['timestamp']}\n**Q:** {h['question']}\n\n**A:** {h['answer']}\n\n---\n"
-    return formatted
+    return "".join(
+        f"### {h['timestamp']}\n**Q:** {h['question']}\n\n**A:** {h['answer']}\n\n---\n"
+        for h in reversed(history)
+    )
 
 
 # --- Gradio UI Design ---
@@ -187,7 +198,7 @@ with gr.Blocks(theme=gr.themes.Soft(), css="""
                 with gr.Row():
                     preset_dd = gr.Dropdown(
                         label="Style preset",
-                        choices=["Standard", "Concise", "Teacher", "Developer", "Researcher"],
+                        choices=list(_PRESETS),
                         value="Standard",
                     )
                 system_tb = gr.Textbox(label="System instruction (optional)", placeholder="e.g., Answer concisely with examples where helpful.")
@@ -1,50 +1,45 @@
-"""Stub pyaudioop module for Python 3.13 environments where audioop is unavailable.
-This satisfies pydub imports used indirectly by Gradio when audio features aren't needed.
-Functions return benign defaults. If audio processing is required, install a Python version
-with audioop support (<=3.12) for full fidelity.
-"""
-
-# Basic helpers expected by pydub when probing audio; we return neutral values.
-
-def rms(fragment, width):
-    return 0
-
-def avg(fragment, width):
-    return 0
-
-def maxpp(fragment, width):
-    return 0
-
-def findmax(fragment, width):
-    return 0
-
-def cross(fragment, width):
-    return 0
-
-def add(fragment1, fragment2, width):
-    return fragment1  # no-op
+"""Fallback audioop module for Python 3.13+, where the stdlib audioop was removed.
 
-def bias(fragment, width, bias):
-    return fragment
+pydub (imported indirectly by Gradio) falls back to ``import pyaudioop as audioop``
+when ``audioop`` is missing. This module re-exports the C implementation whenever one
+is importable -- the stdlib module on Python <= 3.12, or the ``audioop-lts`` backport
+on 3.13+ -- so audio operations run at native speed with correct results.
 
-def mul(fragment, width, factor):
-    return fragment
-
-def tomono(fragment, width, left, right):
-    return fragment
-
-def tostereo(fragment, width, left, right):
-    return fragment
-
-def reverse(fragment, width):
-    return fragment
-
-def lin2lin(fragment, width, newwidth):
-    return fragment
-
-def ratecv(fragment, width, nchannels, inrate, outrate, state, weightA=1, weightB=0):
-    # Return fragment unchanged and None state
-    return fragment, None
-
-def getsample(fragment, width, index):
-    return 0
+If no C implementation is installed, every function raises ``error`` instead of
+returning placeholder values; the text-only app never calls them, and any audio path
+that does should fail loudly. Install ``audioop-lts`` to enable audio processing.
+"""
+import warnings
+
+_FUNCTIONS = (
+    "add", "adpcm2lin", "alaw2lin", "avg", "avgpp", "bias", "byteswap", "cross",
+    "findfactor", "findfit", "findmax", "getsample", "lin2adpcm", "lin2alaw",
+    "lin2lin", "lin2ulaw", "max", "maxpp", "minmax", "mul", "ratecv", "reverse",
+    "rms", "tomono", "tostereo", "ulaw2lin",
+)
+
+try:
+    with warnings.catch_warnings():
+        # the stdlib module emits a DeprecationWarning on 3.11/3.12
+        warnings.simplefilter("ignore", DeprecationWarning)
+        import audioop as _audioop
+except ImportError:
+    _audioop = None
+
+if _audioop is not None:
+    error = _audioop.error
+    globals().update({name: getattr(_audioop, name) for name in _FUNCTIONS})
+else:
+    class error(Exception):
+        pass
+
+    def _unavailable(name):
+        def func(*args, **kwargs):
+            raise error(
+                f"audioop.{name} is unavailable: install 'audioop-lts' "
+                "to enable audio processing on Python 3.13+"
+            )
+        func.__name__ = name
+        return func
+
+    globals().update({name: _unavailable(name) for name in _FUNCTIONS})
@@ -0,0 +1,9 @@
+import pytest
+
+import utils.research_tools as research_tools
+
+
+@pytest.fixture(autouse=True)
+def isolated_response_cache(tmp_path, monkeypatch):
+    # keep the on-disk Groq response cache out of the working tree
+    monkeypatch.setattr(research_tools, "GROQ_CACHE_PATH", str(tmp_path / "groq.sqlite3"))
@@ -0,0 +1,102 @@
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+from diskcache import Cache
+
+from utils import html_text
+from utils.html_text import (
+    MAX_FETCH_BYTES,
+    URL_CACHE_TTL,
+    charset_from_content_type,
+    download_url_text,
+    extract_text,
+    fetch_url_text,
+)
+
+
+def _fake_page(body: bytes, content_type: str = "text/html"):
+    resp = MagicMock()
+    resp.__enter__.return_value = resp
+    resp.headers = {"Content-Type": content_type}
+    resp.raw.read.side_effect = lambda n, decode_content=False: body[:n]
+    return resp
+
+
+def test_utf8_body_without_meta_charset():
+    body = b"<html><body><p>caf\xc3\xa9 \xe2\x80\x94</p></body></html>"
+    assert extract_text(body, None, 100) == "café —"
+
+
+def test_header_charset_is_used():
+    body = b"<p>caf\xe9</p>"
+    assert extract_text(body, charset_from_content_type("text/html; charset=ISO-8859-1"), 100) == "café"
+
+
+def test_meta_charset_used_when_body_is_not_utf8():
+    body = b'<html><head><meta charset="windows-1252"></head><body><p>caf\xe9</p></body></html>'
+    assert extract_text(body, None, 100) == "café"
+
+
+def test_strips_scripts_and_caps_length():
+    body = b"<html><head><script>var a=1</script></head><body><h1>Title</h1><p>Hello world</p></body></html>"
+    assert extract_text(body, "utf-8", 100) == "Title\nHello world"
+    assert extract_text(body, "utf-8", 8) == "Title\nHe"
+
+
+def test_charset_from_content_type():
+    assert charset_from_content_type('text/html; charset="UTF-8"') == "UTF-8"
+    assert charset_from_content_type("text/html") is None
+    assert charset_from_content_type(None) is None
+
+
+def test_unknown_header_charset_falls_back_to_sniffing():
+    assert extract_text(b"<p>caf\xc3\xa9</p>", "no-such-charset", 100) == "café"
+
+
+def test_utf8_body_truncated_mid_character():
+    body = "<p>東京 café</p>".encode("utf-8")
+    cut = body[: body.index("京".encode("utf-8")) + 1]
+    assert extract_text(cut, None, 100).startswith("東")
+
+
+def test_download_caps_body_and_keeps_utf8_across_the_cut():
+    # pad so the cap falls inside the second character of "東京"
+    prefix = b"<p>" + b"a" * (MAX_FETCH_BYTES - 9) + b" "
+    body = prefix + "東京 café</p>".encode("utf-8")
+    resp = _fake_page(body)
+    with patch.object(html_text._FETCH_SESSION, "get", return_value=resp):
+        text = download_url_text("https://example.com", 10**6)
+    resp.raw.read.assert_called_once_with(MAX_FETCH_BYTES, decode_content=True)
+    assert text.split()[-1].startswith("東")
+    assert "café" not in text
+
+
+@pytest.fixture
+def url_cache(tmp_path, monkeypatch):
+    cache = Cache(str(tmp_path / "urls"))
+    monkeypatch.setattr(html_text, "_URL_CACHE", cache)
+    yield cache
+    cache.close()
+
+
+def test_fetch_caches_text_by_stripped_url_and_max_chars(url_cache, monkeypatch):
+    download = MagicMock(return_value="Page text")
+    monkeypatch.setattr(html_text, "download_url_text", download)
+    before = time.time()
+    assert fetch_url_text("  https://example.com\n", 100) == "Page text"
+    assert fetch_url_text("https://example.com", 100) == "Page text"
+    download.assert_called_once_with("https://example.com", 100)
+    value, expire_time = url_cache.get(("https://example.com", 100), expire_time=True)
+    assert value == "Page text"
+    assert before + URL_CACHE_TTL <= expire_time <= time.time() + URL_CACHE_TTL
+
+
+def test_fetch_failures_are_not_cached(url_cache, monkeypatch):
+    download = MagicMock(side_effect=requests.HTTPError("404 Not Found"))
+    monkeypatch.setattr(html_text, "download_url_text", download)
+    assert fetch_url_text("https://example.com/gone", 100).startswith("[Could not fetch URL content")
+    assert ("https://example.com/gone", 100) not in url_cache
+    fetch_url_text("https://example.com/gone", 100)
+    assert download.call_count == 2
@@ -1,6 +1,6 @@
 import os
 import json
-from utils.logger import log_interaction, get_history, clear_history, export_history_json, export_history_markdown
+from utils.logger import log_interaction, get_history, get_recent_history, clear_history, export_history_json, export_history_markdown
 
 
 def setup_function(function):
@@ -16,6 +16,13 @@ def test_log_and_get_history():
     assert hist[1]["answer"] == "A2"
 
 
+def test_get_recent_history_returns_last_entries_in_order():
+    for i in range(5):
+        log_interaction(f"Q{i}", f"A{i}")
+    assert [h["question"] for h in get_recent_history(3)] == ["Q2", "Q3", "Q4"]
+    assert len(get_recent_history(10)) == 5
+
+
 def test_export_json_and_markdown():
     log_interaction("Why?", "Because.")
     js = export_history_json()
@@ -24,3 +31,44 @@ def test_export_json_and_markdown():
     md = export_history_markdown()
     assert "Because." in md
 
+
+def test_legacy_json_log_is_migrated(tmp_path, monkeypatch):
+    import utils.logger as logger
+
+    legacy = tmp_path / "history.json"
+    legacy.write_text(json.dumps([{"timestamp": "t", "question": "Old", "answer": "Log"}]))
+    monkeypatch.setattr(logger, "LEGACY_LOG_PATH", str(legacy))
+    monkeypatch.setattr(logger, "LOG_PATH", str(tmp_path / "history.jsonl"))
+    history = logger._load_history()
+    assert [h["question"] for h in history] == ["Old"]
+    assert (tmp_path / "history.jsonl").read_text().count("\n") == 1
+
+
+def test_partial_last_line_does_not_swallow_next_entry(tmp_path, monkeypatch):
+    import utils.logger as logger
+
+    log_path = tmp_path / "history.jsonl"
+    log_path.write_bytes(b'{"timestamp":"t","question":"A","answer":"a"}\n{"timestamp":"t","question":"B","ans')
+    monkeypatch.setattr(logger, "LOG_PATH", str(log_path))
+    monkeypatch.setattr(logger, "_HISTORY", logger._load_history())
+    logger.log_interaction("C", "c")
+    assert [h["question"] for h in logger._load_history()] == ["A", "C"]
+
+
+def test_read_only_log_still_loads(tmp_path, monkeypatch):
+    import utils.logger as logger
+
+    log_path = tmp_path / "history.jsonl"
+    log_path.write_bytes(b'{"timestamp":"t","question":"A","answer":"a"}\n{"timestamp":"t","que')
+    log_path.chmod(0o444)
+    monkeypatch.setattr(logger, "LOG_PATH", str(log_path))
+    real_open = open
+
+    def no_write_open(path, mode="r", *args, **kwargs):
+        # also covers running as root, where chmod alone doesn't block writes
+        if path == str(log_path) and mode != "rb":
+            raise PermissionError(13, "Permission denied", path)
+        return real_open(path, mode, *args, **kwargs)
+
+    monkeypatch.setattr("builtins.open", no_write_open)
+    assert [h["question"] for h in logger._load_history()] == ["A"]
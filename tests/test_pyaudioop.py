@@ -0,0 +1,26 @@
+import importlib
+import struct
+import sys
+
+import pytest
+
+import pyaudioop
+
+
+def test_delegates_to_c_audioop():
+    if pyaudioop._audioop is None:
+        pytest.skip("no C audioop implementation installed")
+    fragment = struct.pack("<4h", 3, -3, 3, -3)
+    assert pyaudioop.rms(fragment, 2) == 3
+    assert pyaudioop.mul(fragment, 2, 2) == struct.pack("<4h", 6, -6, 6, -6)
+
+
+def test_raises_without_c_audioop(monkeypatch):
+    monkeypatch.setitem(sys.modules, "audioop", None)
+    fallback = importlib.reload(pyaudioop)
+    try:
+        with pytest.raises(fallback.error, match="audioop-lts"):
+            fallback.rms(b"\x00\x00", 2)
+    finally:
+        monkeypatch.undo()
+        importlib.reload(pyaudioop)
@@ -1,17 +1,42 @@
+import asyncio
 import json
 from unittest.mock import patch, MagicMock
+
+import httpx
+
 from utils.research_tools import GroqClient
 
 
+def _chat_response(content):
+    """A fake non-streaming requests response carrying one completion."""
+    resp = MagicMock()
+    resp.status_code = 200
+    resp.json.return_value = {"choices": [{"message": {"content": content}}]}
+    return resp
+
+
+def _mock_async_transport(client, handler):
+    """Route the client's async HTTP calls to handler(request) -> httpx.Response."""
+    client._async_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def _collect_streams(client, *prompts):
+    """Run achat_stream for each prompt in turn, then close the async client."""
+    async def collect():
+        results = []
+        try:
+            for prompt in prompts:
+                results.append([d async for d in client.achat_stream(prompt, max_tokens=16)])
+        finally:
+            await client.aclose()
+        return results
+
+    return asyncio.run(collect())
+
+
 def test_client_formats_payload_and_parses_response():
     client = GroqClient(api_key="test_key")
-    fake_resp = MagicMock()
-    fake_resp.status_code = 200
-    fake_resp.json.return_value = {
-        "choices": [
-            {"message": {"content": "Hello world"}}
-        ]
-    }
+    fake_resp = _chat_response("Hello world")
     with patch.object(client.session, "post", return_value=fake_resp) as post:
         out = client.chat("Hi", model="llama3-70b-8192", max_tokens=16)
     assert out == "Hello world"
@@ -23,7 +48,7 @@ def test_client_formats_payload_and_parses_response():
     assert payload["messages"][0]["role"] in ("system", "user")
 
 
-def test_stream_yields_accumulated():
+def test_stream_yields_deltas():
     client = GroqClient(api_key="test_key")
     # Simulate SSE data chunks
     stream_lines = [
@@ -32,7 +57,140 @@ def test_stream_yields_accumulated():
         b"data: [DONE]",
     ]
     fake_resp = MagicMock()
-    fake_resp.iter_lines.return_value = (l.decode("utf-8") for l in stream_lines)
+    fake_resp.iter_lines.return_value = iter(stream_lines)
     with patch.object(client, "_post", return_value=fake_resp):
         chunks = list(client.chat_stream("Hi", max_tokens=16))
-    assert chunks[-1] == "Hello"
+    assert chunks == ["Hel", "lo"]
+
+
+def test_chat_cache_survives_new_client(tmp_path):
+    cache_path = str(tmp_path / "cache.sqlite3")
+    fake_resp = _chat_response("Cached")
+    first = GroqClient(api_key="test_key", cache_path=cache_path)
+    with patch.object(first.session, "post", return_value=fake_resp):
+        assert first.chat("What is this?\n", max_tokens=16) == "Cached"
+    second = GroqClient(api_key="test_key", cache_path=cache_path)
+    with patch.object(second.session, "post") as post:
+        assert second.chat("What is this?", max_tokens=16) == "Cached"
+    post.assert_not_called()
+
+
+def test_chat_cache_ignores_expired_rows(tmp_path):
+    cache_path = str(tmp_path / "cache.sqlite3")
+    fake_resp = _chat_response("Fresh")
+    first = GroqClient(api_key="test_key", cache_path=cache_path)
+    with patch.object(first.session, "post", return_value=fake_resp):
+        first.chat("Q", max_tokens=16)
+    first._get_db().execute("UPDATE responses SET ts = 0")
+    first._get_db().commit()
+    second = GroqClient(api_key="test_key", cache_path=cache_path)
+    with patch.object(second.session, "post", return_value=fake_resp) as post:
+        second.chat("Q", max_tokens=16)
+    post.assert_called_once()
+    assert second._get_db().execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 1
+
+
+def test_chat_cache_key_keeps_inner_whitespace():
+    fake_resp = _chat_response("ok")
+    client = GroqClient(api_key="test_key")
+    with patch.object(client.session, "post", return_value=fake_resp) as post:
+        client.chat("def f():\n    return 1", max_tokens=16)
+        client.chat("def f():\n  return 1", max_tokens=16)
+    assert post.call_count == 2
+
+
+def test_history_sent_as_messages_between_system_and_prompt():
+    client = GroqClient(api_key="test_key")
+    fake_resp = _chat_response("ok")
+    history = [
+        {"role": "user", "content": "Earlier question"},
+        {"role": "assistant", "content": "Earlier answer"},
+    ]
+    with patch.object(client.session, "post", return_value=fake_resp) as post:
+        client.chat("Now?", system="Be brief.  \n", history=history, max_tokens=16)
+    payload = json.loads(post.call_args.kwargs["data"])
+    assert payload["messages"] == [
+        {"role": "system", "content": "Be brief."},
+        *history,
+        {"role": "user", "content": "Now?"},
+    ]
+
+
+def test_async_stream_yields_deltas():
+    body = (
+        b"data: {\"choices\":[{\"delta\":{\"content\":\"Hel\"}}]}\n\n"
+        b"data: {\"choices\":[{\"delta\":{\"content\":\"lo\"}}]}\n\n"
+        b"data: [DONE]\n\n"
+    )
+    client = GroqClient(api_key="test_key")
+    _mock_async_transport(client, lambda request: httpx.Response(200, content=body))
+
+    assert _collect_streams(client, "Hi")[0] == ["Hel", "lo"]
+
+
+def test_async_client_sends_only_auth_and_content_type():
+    client = GroqClient(api_key="test_key")
+    headers = client._get_async_client().headers
+    assert headers["Authorization"] == "Bearer test_key"
+    assert headers["Content-Type"] == "application/json"
+    # requests' session defaults are no longer copied over
+    assert not headers["User-Agent"].startswith("python-requests")
+    asyncio.run(client.aclose())
+
+
+def test_async_stream_retries_transient_status():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(503, json={"error": {"message": "busy"}})
+        return httpx.Response(200, content=b"data: {\"choices\":[{\"delta\":{\"content\":\"ok\"}}]}\n\n")
+
+    client = GroqClient(api_key="test_key")
+    client.backoff = 0
+    _mock_async_transport(client, handler)
+
+    assert _collect_streams(client, "Hi")[0] == ["ok"]
+    assert len(calls) == 2
+
+
+def test_async_stream_handles_lines_split_across_chunks():
+    pieces = [
+        b"data: {\"choices\":[{\"delta\":{\"role\":\"assistant\"}}]}\r\n\r\ndata: {\"choi",
+        b"ces\":[{\"delta\":{\"content\":\"Hi\"}}]}\n",
+        b"\ndata: [DONE]",
+    ]
+
+    async def body():
+        for piece in pieces:
+            yield piece
+
+    client = GroqClient(api_key="test_key")
+    _mock_async_transport(client, lambda request: httpx.Response(200, content=body()))
+
+    assert _collect_streams(client, "Hi")[0] == ["Hi"]
+
+
+def test_async_stream_reads_and_writes_response_cache():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, content=b"data: {\"choices\":[{\"delta\":{\"content\":\"Hel\"}}]}\n\ndata: {\"choices\":[{\"delta\":{\"content\":\"lo\"}}]}\n\n")
+
+    client = GroqClient(api_key="test_key")
+    _mock_async_transport(client, handler)
+
+    assert _collect_streams(client, "Hi", "Hi") == [["Hel", "lo"], ["Hello"]]
+    assert len(calls) == 1
+    # the non-streaming path shares the same cache entry
+    assert client.chat("Hi", max_tokens=16) == "Hello"
+
+
+def test_async_stream_does_not_cache_errors():
+    client = GroqClient(api_key="test_key")
+    _mock_async_transport(client, lambda request: httpx.Response(401, json={"error": {"message": "bad key"}}))
+
+    assert _collect_streams(client, "Hi")[0][0].startswith("Error communicating with Groq API")
+    assert client._cache_get(client._cache_key("Hi", "llama-3.1-8b-instant", 0.7, 16, 1.0, None, None)) is None
@@ -0,0 +1,124 @@
+"""Fetching web pages and extracting their plain text."""
+import codecs
+import re
+from typing import Optional
+
+import requests
+from diskcache import Cache
+from lxml import etree, html
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# upper bound on page bytes read per fetch; plenty for typical article HTML
+MAX_FETCH_BYTES = 256 * 1024
+
+# shared session for page fetches so connections are pooled across summaries
+_FETCH_SESSION = requests.Session()
+_FETCH_ADAPTER = HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(
+        total=2, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504]
+    ),
+)
+_FETCH_SESSION.mount("http://", _FETCH_ADAPTER)
+_FETCH_SESSION.mount("https://", _FETCH_ADAPTER)
+_FETCH_SESSION.headers.update(
+    {
+        "User-Agent": "Mozilla/5.0 (compatible; GroqAI-Research-Companion/1.0)",
+        "Accept-Encoding": "gzip, deflate",
+    }
+)
+
+# cleaned page text keyed by (url, max_chars), persisted across restarts; opened lazily
+URL_CACHE_DIR = "cache/urls"
+URL_CACHE_TTL = 24 * 60 * 60
+_URL_CACHE: Optional[Cache] = None
+
+_CHARSET_RE = re.compile(r"""charset\s*=\s*["']?([\w.:-]+)""", re.IGNORECASE)
+
+
+def charset_from_content_type(content_type: Optional[str]) -> Optional[str]:
+    """Return the charset parameter of a Content-Type header, if it declares one."""
+    match = _CHARSET_RE.search(content_type or "")
+    return match.group(1) if match else None
+
+
+def _take_chars(strings, max_chars: int):
+    # yield stripped strings until roughly max_chars have been produced
+    total = 0
+    for s in strings:
+        if total >= max_chars:
+            break
+        total += len(s) + 1
+        yield s
+
+
+def _parse(body: bytes, encoding: Optional[str]):
+    if encoding is not None:
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            # unknown charset name in the header; sniff as if none was given
+            encoding = None
+    if encoding is None:
+        # Without a header charset libxml2 only honours <meta charset> and
+        # otherwise assumes Latin-1, so prefer UTF-8 whenever the bytes are valid UTF-8.
+        try:
+            # incremental so a body cut mid-character by the fetch size cap
+            # still counts as UTF-8
+            codecs.getincrementaldecoder("utf-8")().decode(body, final=False)
+            encoding = "utf-8"
+        except UnicodeDecodeError:
+            return html.document_fromstring(body)
+    return html.document_fromstring(body, parser=html.HTMLParser(encoding=encoding))
+
+
+def extract_text(body: bytes, encoding: Optional[str], max_chars: int) -> str:
+    """Return up to max_chars of visible text from an HTML body, one text node per line."""
+    doc = _parse(body, encoding)
+    # remove scripts/styles (and comments) in a single C-level pass
+    etree.strip_elements(
+        doc, "script", "style", "noscript", etree.Comment, with_tail=False
+    )
+    strings = (s.strip() for s in doc.itertext())
+    text = "\n".join(_take_chars((s for s in strings if s), max_chars))
+    return text[:max_chars]
+
+
+def download_url_text(url: str, max_chars: int) -> str:
+    """Fetch url and return its extracted text. Raises on network or HTTP errors."""
+    with _FETCH_SESSION.get(url, timeout=(5, 20), stream=True) as r:
+        r.raise_for_status()
+        # cap the (decompressed) body so huge pages can't blow up download/parse time
+        body = r.raw.read(MAX_FETCH_BYTES, decode_content=True)
+        encoding = charset_from_content_type(r.headers.get("Content-Type"))
+    return extract_text(body, encoding, max_chars)
+
+
+def _get_url_cache() -> Cache:
+    global _URL_CACHE
+    if _URL_CACHE is None:
+        _URL_CACHE = Cache(URL_CACHE_DIR)
+    return _URL_CACHE
+
+
+def fetch_url_text(url: str, max_chars: int = 6000) -> str:
+    """Return the page's text, from the 24h disk cache when possible.
+
+    Cache hits are served without revalidating against the origin, so a page
+    that has since gone away (404/410) keeps being served until its entry expires.
+    """
+    url = url.strip()
+    key = (url, max_chars)
+    cache = _get_url_cache()
+    text = cache.get(key)
+    if text is not None:
+        return text
+    try:
+        text = download_url_text(url, max_chars)
+    except Exception:
+        # failures are never cached, so the next request retries the origin
+        return f"[Could not fetch URL content, summarizing the URL contextually instead]\nURL: {url}"
+    cache.set(key, text, expire=URL_CACHE_TTL)
+    return text
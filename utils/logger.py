@@ -1,44 +1,103 @@
 import json
 import os
+import threading
+from collections import deque
 from datetime import datetime
+from itertools import islice
 
-LOG_PATH = "logs/history.json"
+from utils import jsonutil
 
-def log_interaction(question, answer):
-    os.makedirs("logs", exist_ok=True)
+# one JSON object per line, so logging a turn is a single append
+LOG_PATH = "logs/history.jsonl"
+# the whole-array format used before the switch to JSON Lines
+LEGACY_LOG_PATH = "logs/history.json"
+
+_LOCK = threading.Lock()
+
+
+def _migrate_legacy_log():
+    """Convert logs/history.json to JSON Lines once, if no JSONL log exists yet."""
+    if os.path.exists(LOG_PATH) or not os.path.exists(LEGACY_LOG_PATH):
+        return
+    try:
+        with open(LEGACY_LOG_PATH, "rb") as f:
+            entries = jsonutil.loads(f.read())
+    except json.JSONDecodeError:
+        return
+    tmp_path = LOG_PATH + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.writelines(jsonutil.dumps(entry) + b"\n" for entry in entries)
+    os.replace(tmp_path, LOG_PATH)
+
+
+def _repair_partial_line(size: int):
+    """Truncate the log to size bytes; best-effort, e.g. the file may be read-only."""
+    try:
+        with open(LOG_PATH, "r+b") as f:
+            f.truncate(size)
+    except OSError:
+        pass
+
+
+def _load_history():
+    _migrate_legacy_log()
+    history = deque()
     try:
-        with open(LOG_PATH, "r") as f:
-            history = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        history = []
+        with open(LOG_PATH, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return history
+    if data and not data.endswith(b"\n"):
+        # drop a partial line left by a crash mid-write, so the next
+        # append starts on a fresh line instead of joining onto it
+        data = data[: data.rfind(b"\n") + 1]
+        _repair_partial_line(len(data))
+    for line in data.splitlines():
+        if not line.strip():
+            continue
+        try:
+            history.append(jsonutil.loads(line))
+        except json.JSONDecodeError:
+            continue
+    return history
+
+
+# in-memory mirror of the log file, loaded once at import
+_HISTORY = _load_history()
 
-    history.append({
+
+def log_interaction(question, answer):
+    entry = {
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "question": question,
         "answer": answer
-    })
-
-    with open(LOG_PATH, "w") as f:
-        json.dump(history, f, indent=2)
+    }
+    with _LOCK:
+        os.makedirs("logs", exist_ok=True)
+        with open(LOG_PATH, "ab") as f:
+            f.write(jsonutil.dumps(entry) + b"\n")
+        _HISTORY.append(entry)
 
 def get_history():
-    try:
-        with open(LOG_PATH, "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+    return list(_HISTORY)
+
+
+def get_recent_history(n: int):
+    """Return the last n entries, oldest first, without copying the whole history."""
+    return list(islice(reversed(_HISTORY), n))[::-1]
 
 
 def clear_history():
     """Delete all saved history."""
-    os.makedirs("logs", exist_ok=True)
-    with open(LOG_PATH, "w") as f:
-        json.dump([], f)
+    with _LOCK:
+        os.makedirs("logs", exist_ok=True)
+        open(LOG_PATH, "wb").close()
+        _HISTORY.clear()
 
 
 def export_history_json() -> str:
     """Return history as a JSON string."""
-    return json.dumps(get_history(), indent=2)
+    return jsonutil.dumps(get_history(), indent=True).decode("utf-8")
 
 
 def export_history_markdown() -> str:
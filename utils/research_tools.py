@@ -1,15 +1,26 @@
 import os
 import time
 import json
+import asyncio
+import sqlite3
+import threading
+import httpx
 import requests
 from collections import OrderedDict
-from typing import Generator, Optional
+from typing import AsyncGenerator, Dict, Generator, List, Optional
 from dotenv import load_dotenv
 
+from utils import jsonutil
+
 load_dotenv()
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
+# on-disk response cache shared across restarts; set to "" to disable
+GROQ_CACHE_PATH = os.getenv("GROQ_CACHE_PATH", "cache/groq_responses.sqlite3")
+
+# returned by GroqClient._parse_sse_line for the terminating "data: [DONE]" event
+_SSE_DONE = object()
 
 
 class GroqClient:
@@ -22,7 +33,12 @@ class GroqClient:
     - message format: messages must be a list of {role, content}.
     """
 
-    def __init__(self, api_key: Optional[str] = None, base_url: str = GROQ_URL):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: str = GROQ_URL,
+        cache_path: Optional[str] = None,
+    ):
         self.api_key = api_key or GROQ_API_KEY
         if not self.api_key:
             raise RuntimeError(
@@ -30,12 +46,11 @@ class GroqClient:
             )
         self.base_url = base_url
         self.session = requests.Session()
-        self.session.headers.update(
-            {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-            }
-        )
+        self._headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+        self.session.headers.update(self._headers)
         self.timeout = 30
         self.max_retries = 3
         self.backoff = 1.5
@@ -44,13 +59,103 @@ class GroqClient:
         # tiny in-memory LRU cache to accelerate repeated prompts
         self._cache = OrderedDict()
         self._cache_limit = 64
+        # persistent second tier behind the LRU, opened lazily
+        self.cache_path = GROQ_CACHE_PATH if cache_path is None else cache_path
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.cache_ttl = 7 * 24 * 60 * 60  # seconds a disk-cached response stays valid
+        # async HTTP/2 client for streaming from async handlers, created lazily
+        self._async_client: Optional[httpx.AsyncClient] = None
 
-    def _sleep_for_rate_limit(self):
+    def _get_db(self) -> Optional[sqlite3.Connection]:
+        if not self.cache_path:
+            return None
+        if self._db is None:
+            directory = os.path.dirname(self.cache_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.cache_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, value TEXT, ts INTEGER)"
+            )
+            # prune expired rows once per process so the file doesn't grow forever
+            self._db.execute(
+                "DELETE FROM responses WHERE ts < ?", (int(time.time()) - self.cache_ttl,)
+            )
+            self._db.commit()
+        return self._db
+
+    def _cache_get(self, key: str) -> Optional[str]:
+        if key in self._cache:
+            # move to end (most recently used)
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        row = None
+        try:
+            with self._db_lock:
+                db = self._get_db()
+                if db is not None:
+                    row = db.execute(
+                        "SELECT value FROM responses WHERE key = ? AND ts >= ?",
+                        (key, int(time.time()) - self.cache_ttl),
+                    ).fetchone()
+        except sqlite3.Error:
+            pass
+        if row:
+            self._cache_remember(key, row[0])
+            return row[0]
+        return None
+
+    def _cache_remember(self, key: str, value: str):
+        self._cache[key] = value
+        if len(self._cache) > self._cache_limit:
+            self._cache.popitem(last=False)
+
+    def _cache_put(self, key: str, value: str):
+        self._cache_remember(key, value)
+        try:
+            with self._db_lock:
+                db = self._get_db()
+                if db is not None:
+                    db.execute(
+                        "INSERT OR REPLACE INTO responses (key, value, ts) VALUES (?, ?, ?)",
+                        (key, value, int(time.time())),
+                    )
+                    db.commit()
+        except sqlite3.Error:
+            # the disk cache is best-effort; the in-memory tier still works
+            pass
+
+    def _rate_limit_delay(self) -> float:
+        """Reserve the next call slot and return how long to wait before using it."""
         now = time.time()
-        elapsed = now - self._last_call
-        if elapsed < self._min_interval:
-            time.sleep(self._min_interval - elapsed)
-        self._last_call = time.time()
+        delay = max(0.0, self._min_interval - (now - self._last_call))
+        self._last_call = now + delay
+        return delay
+
+    def _sleep_for_rate_limit(self):
+        time.sleep(self._rate_limit_delay())
+
+    async def _async_sleep_for_rate_limit(self):
+        await asyncio.sleep(self._rate_limit_delay())
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                http2=True,
+                # only our own headers; requests' defaults (User-Agent,
+                # hop-by-hop Connection) don't belong on the HTTP/2 client
+                headers=self._headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_keepalive_connections=20),
+            )
+        return self._async_client
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
 
     def _post(self, payload: dict, stream: bool = False):
         self._sleep_for_rate_limit()
@@ -59,7 +164,7 @@ class GroqClient:
             try:
                 resp = self.session.post(
                     self.base_url,
-                    data=json.dumps(payload),
+                    data=jsonutil.dumps(payload),
                     timeout=self.timeout,
                     stream=stream,
                 )
@@ -85,21 +190,32 @@ class GroqClient:
                     continue
                 raise
 
-    def chat(
-        self,
+    @staticmethod
+    def _build_messages(
         prompt: str,
-        *,
-    model: str = "llama-3.1-8b-instant",
-        temperature: float = 0.7,
-        max_tokens: int = 512,
-        top_p: float = 1.0,
-        system: Optional[str] = None,
-    ) -> str:
+        system: Optional[str],
+        history: Optional[List[Dict[str, str]]],
+    ) -> List[Dict[str, str]]:
+        # Order is [system] -> [earlier turns] -> [new user message] so the
+        # leading messages stay byte-identical across turns and the
+        # provider's prompt prefix cache can reuse them.
         messages = []
-        if system:
-            messages.append({"role": "system", "content": system})
+        if system and system.rstrip():
+            messages.append({"role": "system", "content": system.rstrip()})
+        for m in history or []:
+            messages.append({"role": m["role"], "content": m["content"]})
         messages.append({"role": "user", "content": prompt})
+        return messages
 
+    @staticmethod
+    def _build_payload(
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        top_p: float,
+        stream: bool = False,
+    ) -> dict:
         payload = {
             "model": model,
             "messages": messages,
@@ -107,28 +223,56 @@ class GroqClient:
             "max_tokens": max(1, int(max_tokens)),
             "top_p": top_p,
         }
-        # cache key
-        key = json.dumps({
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    @staticmethod
+    def _cache_key(
+        prompt: str,
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        top_p: float,
+        system: Optional[str],
+        history: Optional[List[Dict[str, str]]],
+    ) -> str:
+        # only leading/trailing whitespace is ignored, since inner whitespace
+        # (code indentation, tables) changes what Groq is asked
+        return json.dumps({
             "model": model,
-            "system": system or "",
-            "prompt": prompt,
+            "system": (system or "").strip(),
+            "history": [[m["role"], m["content"].strip()] for m in history or []],
+            "prompt": prompt.strip(),
             "temperature": round(float(temperature), 2),
             "max_tokens": int(max_tokens),
             "top_p": round(float(top_p), 2),
         }, sort_keys=True)
-        if key in self._cache:
-            # move to end (most recently used)
-            self._cache.move_to_end(key)
-            return self._cache[key]
+
+    def chat(
+        self,
+        prompt: str,
+        *,
+    model: str = "llama-3.1-8b-instant",
+        temperature: float = 0.7,
+        max_tokens: int = 512,
+        top_p: float = 1.0,
+        system: Optional[str] = None,
+        history: Optional[List[Dict[str, str]]] = None,
+    ) -> str:
+        messages = self._build_messages(prompt, system, history)
+
+        payload = self._build_payload(messages, model, temperature, max_tokens, top_p)
+        key = self._cache_key(prompt, model, temperature, max_tokens, top_p, system, history)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
 
         try:
             resp = self._post(payload)
             data = resp.json()
             out = data["choices"][0]["message"]["content"].strip()
-            # store in cache
-            self._cache[key] = out
-            if len(self._cache) > self._cache_limit:
-                self._cache.popitem(last=False)
+            self._cache_put(key, out)
             return out
         except Exception as e:
             return self._format_error(e)
@@ -142,46 +286,128 @@ class GroqClient:
         max_tokens: int = 512,
         top_p: float = 1.0,
         system: Optional[str] = None,
+        history: Optional[List[Dict[str, str]]] = None,
     ) -> Generator[str, None, None]:
-        messages = []
-        if system:
-            messages.append({"role": "system", "content": system})
-        messages.append({"role": "user", "content": prompt})
+        messages = self._build_messages(prompt, system, history)
 
-        payload = {
-            "model": model,
-            "messages": messages,
-            "temperature": temperature,
-            "max_tokens": max(1, int(max_tokens)),
-            "top_p": top_p,
-            "stream": True,
-        }
+        payload = self._build_payload(
+            messages, model, temperature, max_tokens, top_p, stream=True
+        )
+
+        key = self._cache_key(prompt, model, temperature, max_tokens, top_p, system, history)
+        cached = self._cache_get(key)
+        if cached is not None:
+            yield cached
+            return
 
+        parts = []
         try:
             resp = self._post(payload, stream=True)
-            accumulated = ""
-            for line in resp.iter_lines(decode_unicode=True):
-                if not line:
-                    continue
-                if line.startswith("data: "):
-                    data_str = line[len("data: ") :].strip()
-                    if data_str == "[DONE]":
-                        break
-                    try:
-                        chunk = json.loads(data_str)
-                        delta = (
-                            chunk.get("choices", [{}])[0]
-                            .get("delta", {})
-                            .get("content", "")
-                        )
-                        if delta:
-                            accumulated += delta
-                            yield accumulated
-                    except Exception:
-                        # if parsing fails, ignore this line
-                        continue
+            for raw in resp.iter_lines(decode_unicode=False):
+                delta = self._parse_sse_line(raw)
+                if delta is _SSE_DONE:
+                    break
+                if delta:
+                    parts.append(delta)
+                    yield delta
         except Exception as e:
             yield self._format_error(e)
+            return
+        if parts:
+            self._cache_put(key, "".join(parts).strip())
+
+    async def achat_stream(
+        self,
+        prompt: str,
+        *,
+        model: str = "llama-3.1-8b-instant",
+        temperature: float = 0.7,
+        max_tokens: int = 512,
+        top_p: float = 1.0,
+        system: Optional[str] = None,
+        history: Optional[List[Dict[str, str]]] = None,
+    ) -> AsyncGenerator[str, None]:
+        """Async variant of chat_stream over a pooled HTTP/2 connection."""
+        messages = self._build_messages(prompt, system, history)
+
+        payload = self._build_payload(
+            messages, model, temperature, max_tokens, top_p, stream=True
+        )
+
+        key = self._cache_key(prompt, model, temperature, max_tokens, top_p, system, history)
+        cached = self._cache_get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        attempt = 0
+        parts = []
+        while True:
+            try:
+                await self._async_sleep_for_rate_limit()
+                async with self._get_async_client().stream(
+                    "POST", self.base_url, content=jsonutil.dumps(payload)
+                ) as resp:
+                    if resp.status_code >= 400:
+                        # load the body so the error message can include it
+                        await resp.aread()
+                        resp.raise_for_status()
+                    async for raw in self._aiter_raw_lines(resp):
+                        delta = self._parse_sse_line(raw)
+                        if delta is _SSE_DONE:
+                            break
+                        if delta:
+                            parts.append(delta)
+                            yield delta
+                if parts:
+                    self._cache_put(key, "".join(parts).strip())
+                return
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                attempt += 1
+                # Retry for transient cases, but never once output has been sent
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                transient = status in {429, 500, 502, 503, 504} or isinstance(
+                    e, httpx.TransportError
+                )
+                if attempt <= self.max_retries and transient and not parts:
+                    await asyncio.sleep(self.backoff ** attempt)
+                    continue
+                yield self._format_error(e)
+                return
+            except Exception as e:
+                yield self._format_error(e)
+                return
+
+    @staticmethod
+    def _parse_sse_line(raw: bytes):
+        """Return the content delta in one raw SSE line, "" if it has none, or _SSE_DONE."""
+        if raw[:6] != b"data: ":
+            return ""
+        payload = raw[6:].strip()
+        if payload == b"[DONE]":
+            return _SSE_DONE
+        try:
+            return jsonutil.loads(payload)["choices"][0]["delta"]["content"] or ""
+        except (ValueError, LookupError, TypeError):
+            # malformed line or a chunk without content (e.g. role/finish events)
+            return ""
+
+    @staticmethod
+    async def _aiter_raw_lines(resp: httpx.Response) -> AsyncGenerator[bytes, None]:
+        # httpx only offers decoded str lines, so split the byte stream ourselves
+        buf = bytearray()
+        async for chunk in resp.aiter_bytes():
+            buf += chunk
+            start = 0
+            while True:
+                end = buf.find(b"\n", start)
+                if end < 0:
+                    break
+                yield bytes(buf[start:end]).rstrip(b"\r")
+                start = end + 1
+            del buf[:start]
+        if buf:
+            yield bytes(buf)
 
     @staticmethod
     def _format_error(e: Exception) -> str:
@@ -205,7 +431,9 @@ class GroqClient:
         )
 
 
-# Backwards-compatible function used by the app
+# Process-wide client shared by query_groq and the app's streaming handlers, so
+# they share one instance and one response cache (sync calls still go through
+# requests and async streams through httpx, each with its own connection pool)
 _client: Optional[GroqClient] = None
 
 
@@ -223,6 +451,7 @@ def query_groq(
     max_tokens: int = 512,
     top_p: float = 1.0,
     system: Optional[str] = None,
+    history: Optional[List[Dict[str, str]]] = None,
 ):
     client = _get_client()
     return client.chat(
@@ -232,4 +461,5 @@ def query_groq(
         max_tokens=max_tokens,
         top_p=top_p,
         system=system,
+        history=history,
     )